@@ -0,0 +1,76 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Fast Contour Emit - compiled version of fast_contour_emit.emit_lines
+
+Build in place with: cythonize -i fast_contour_plugin/_fast_emit.pyx
+When the extension is not built the pure-Python implementation is used.
+"""
+
+from libc.stdint cimport uint32_t
+from libc.string cimport memcpy
+
+from qgis.core import QgsFeature, QgsGeometry
+
+from .fast_contour_emit import (
+    FEATURE_BATCH_SIZE,
+    WKB_HEADER_SIZE,
+    WKB_LINESTRING,
+    WKB_LITTLE_ENDIAN,
+    flush_features,
+)
+
+
+cpdef int emit_lines(sink, list line_arrays, double level, int level_idx, fields, feedback):
+    """Write the contour lines of one level to the sink.
+
+    WKB is assembled in a single workspace buffer that only grows, header
+    and coordinates are copied with memcpy (host byte order is assumed to
+    be little-endian). Returns the number of features written.
+    """
+    cdef Py_ssize_t header_size = WKB_HEADER_SIZE
+    cdef Py_ssize_t batch_size = FEATURE_BATCH_SIZE
+    cdef bytearray workspace = bytearray(header_size)
+    cdef char* buf
+    cdef const double[:, ::1] xy
+    cdef Py_ssize_t n, size
+    cdef uint32_t value
+    cdef int total_features = 0
+
+    # Attributes are identical for every line at this level
+    attributes = [level, level_idx]
+    batch = []
+
+    for line_array in line_arrays:
+        # contourpy returns C-contiguous (n_points, 2) float64 arrays
+        xy = line_array
+        n = xy.shape[0]
+        if n < 2:
+            continue
+
+        size = header_size + 16 * n
+        if len(workspace) < size:
+            workspace = bytearray(2 * size)
+        buf = workspace
+
+        buf[0] = WKB_LITTLE_ENDIAN
+        value = WKB_LINESTRING
+        memcpy(buf + 1, &value, 4)
+        value = <uint32_t>n
+        memcpy(buf + 5, &value, 4)
+        memcpy(buf + header_size, &xy[0, 0], 16 * n)
+
+        geometry = QgsGeometry()
+        geometry.fromWkb(buf[:size])
+
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        feature.setAttributes(attributes)
+
+        batch.append(feature)
+        if len(batch) >= batch_size:
+            total_features += flush_features(sink, batch, feedback)
+
+    # Write any remaining features
+    total_features += flush_features(sink, batch, feedback)
+
+    return total_features
@@ -2,6 +2,10 @@
 Fast Contour Algorithm - QGIS Processing Algorithm
 """
 
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.core import (
@@ -15,14 +19,12 @@ from qgis.core import (
     QgsProcessingParameterVectorDestination,
     QgsProcessingParameterFeatureSink,
     QgsVectorLayer,
-    QgsFeature,
-    QgsGeometry,
-    QgsPointXY,
     QgsFields,
     QgsField,
     QgsWkbTypes,
     QgsProcessingException,
     QgsProcessingUtils,
+    QgsRasterBandStats,
     QgsRasterLayer,
 )
 from qgis.PyQt.QtCore import QVariant
@@ -34,6 +36,31 @@ try:
 except ImportError:
     CONTOURPY_AVAILABLE = False
 
+try:
+    from ._fast_emit import emit_lines
+    FAST_EMIT_AVAILABLE = True
+except ImportError:
+    from .fast_contour_emit import emit_lines
+    FAST_EMIT_AVAILABLE = False
+
+from .fast_contour_gpu import GpuContourGenerator, gpu_available
+from .fast_contour_reader import RasterTileReader, tile_grid
+
+# Algorithms offered by the ALGORITHM parameter, in enum order. All but
+# 'gpu' are contourpy algorithms, 'gpu' needs CuPy and a CUDA device.
+ALGORITHMS = ['serial', 'threaded', 'mpl2014', 'mpl2005', 'gpu']
+
+# The mpl algorithms only support line_type="SeparateCode"
+SEPARATE_CODE_ALGORITHMS = ('mpl2014', 'mpl2005')
+
+def contour_chunk_size(shape, thread_count):
+    """Return the threaded contourpy chunk_size for a grid of the given shape.
+
+    Chunks are just small enough to give every thread at least one chunk,
+    contourpy does not join lines across chunk boundaries.
+    """
+    return max(1, -(-max(shape) // thread_count))
+
 
 class FastContourAlgorithm(QgsProcessingAlgorithm):
     """
@@ -46,6 +73,7 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
     INTERVAL = 'INTERVAL'
     LEVELS = 'LEVELS'
     MODE = 'MODE'
+    ALGORITHM = 'ALGORITHM'
     OUTPUT = 'OUTPUT'
 
     def tr(self, string):
@@ -81,6 +109,8 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
             "Choose between:\n"
             "- Interval mode: Generate contours at regular intervals\n"
             "- Custom levels: Specify exact elevation values\n\n"
+            "The gpu algorithm runs marching squares on a CUDA GPU and is worth "
+            "it for large rasters; it requires CuPy.\n\n"
             "Perfect for large geophysical grids, DEMs, and mineral exploration datasets.\n\n"
             "Requires: contourpy library (install with: pip install contourpy)"
         )
@@ -141,6 +171,18 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        # contourpy algorithm
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ALGORITHM,
+                self.tr('Contouring algorithm'),
+                options=ALGORITHMS,
+                defaultValue=ALGORITHMS.index(
+                    'threaded' if (os.cpu_count() or 1) > 1 else 'serial'
+                )
+            )
+        )
+
         # Output
         self.addParameter(
             QgsProcessingParameterFeatureSink(
@@ -168,10 +210,17 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
         mode = self.parameterAsEnum(parameters, self.MODE, context)
         interval = self.parameterAsDouble(parameters, self.INTERVAL, context)
         levels_str = self.parameterAsString(parameters, self.LEVELS, context)
+        algorithm = ALGORITHMS[self.parameterAsEnum(parameters, self.ALGORITHM, context)]
 
         if raster_layer is None:
             raise QgsProcessingException(self.tr('Invalid input raster layer'))
 
+        if algorithm == 'gpu' and not gpu_available():
+            feedback.reportError(
+                'GPU contouring requires CuPy and a CUDA device, using the serial algorithm'
+            )
+            algorithm = 'serial'
+
         feedback.pushInfo(f'Processing raster: {raster_layer.name()}')
         feedback.pushInfo(f'Band: {band_number}')
 
@@ -183,36 +232,35 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
 
         feedback.pushInfo(f'Raster dimensions: {width} x {height}')
 
-        # Read the raster band as numpy array
-        block = provider.block(band_number, extent, width, height)
-        
-        # Convert to numpy array
-        data = np.zeros((height, width), dtype=np.float64)
-        for row in range(height):
-            for col in range(width):
-                value = block.value(row, col)
-                data[row, col] = value
-
-        # Handle nodata
-        nodata = provider.sourceNoDataValue(band_number)
-        if nodata is not None:
-            data = np.ma.masked_equal(data, nodata)
-            feedback.pushInfo(f'NoData value: {nodata}')
-
-        # Create coordinate arrays
-        x_res = extent.width() / width
-        y_res = extent.height() / height
-        
-        x = np.linspace(
-            extent.xMinimum() + x_res / 2,
-            extent.xMaximum() - x_res / 2,
-            width
-        )
-        y = np.linspace(
-            extent.yMaximum() - y_res / 2,
-            extent.yMinimum() + y_res / 2,
-            height
-        )
+        # The raster is streamed in tiles so memory stays bounded
+        reader = RasterTileReader(provider, band_number, extent, width, height)
+        tiles = tile_grid(width, height)
+        feedback.pushInfo(f'Processing in {len(tiles)} tile(s)')
+
+        if reader.nodata is not None:
+            feedback.pushInfo(f'NoData value: {reader.nodata}')
+
+        # Data range, computed once and reused below. Multi-tile rasters only
+        # need a global range to place interval levels, custom levels are
+        # pruned against each tile's own range instead.
+        preloaded = None
+        vmin, vmax = -np.inf, np.inf
+        if len(tiles) == 1:
+            preloaded = reader.read(tiles[0])
+            # Plain floats, float32 scalars would build the levels in float32
+            vmin, vmax = float(np.nanmin(preloaded)), float(np.nanmax(preloaded))
+        elif mode == 0:
+            stats = provider.bandStatistics(
+                band_number,
+                QgsRasterBandStats.Min | QgsRasterBandStats.Max,
+                extent,
+                0
+            )
+            vmin, vmax = stats.minimumValue, stats.maximumValue
+        if not vmin <= vmax:
+            raise QgsProcessingException(
+                self.tr('Raster band contains only NoData values')
+            )
 
         # Determine contour levels
         if mode == 0:  # Interval mode
@@ -220,13 +268,13 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
                 raise QgsProcessingException(
                     self.tr('Contour interval must be greater than 0')
                 )
-            
-            vmin, vmax = np.nanmin(data), np.nanmax(data)
+
             levels = np.arange(
                 np.floor(vmin / interval) * interval,
                 np.ceil(vmax / interval) * interval + interval,
                 interval
             )
+            order = np.arange(len(levels))
             feedback.pushInfo(f'Generating contours at {interval} interval')
         else:  # Custom levels
             if not levels_str:
@@ -234,15 +282,33 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
                     self.tr('Custom levels must be provided')
                 )
             try:
-                levels = [float(x.strip()) for x in levels_str.split(',')]
+                levels = np.array(levels_str.split(','), dtype=np.float64)
             except ValueError:
                 raise QgsProcessingException(
                     self.tr('Invalid custom levels format. Use comma-separated numbers.')
                 )
+            if levels.size == 0 or not np.isfinite(levels).all():
+                raise QgsProcessingException(
+                    self.tr('Invalid custom levels format. Use comma-separated numbers.')
+                )
+            # Monotone level order lets contourpy reuse its cell cache, order
+            # keeps each level's index in the list as entered
+            order = np.argsort(levels, kind='stable')
+            levels = levels[order]
             feedback.pushInfo(f'Generating contours at custom levels: {levels}')
 
         feedback.pushInfo(f'Number of contour levels: {len(levels)}')
 
+        # Drop levels outside the data range, they cannot produce contours.
+        # level_ids keeps each remaining level's index in the full list.
+        in_range = (levels >= vmin) & (levels <= vmax)
+        level_ids = order[in_range]
+        if len(level_ids) < len(levels):
+            feedback.pushInfo(
+                f'Skipping {len(levels) - len(level_ids)} levels outside the data range'
+            )
+        levels = levels[in_range]
+
         # Create output fields
         fields = QgsFields()
         fields.append(QgsField('elevation', QVariant.Double))
@@ -262,96 +328,186 @@ class FastContourAlgorithm(QgsProcessingAlgorithm):
             raise QgsProcessingException(self.tr('Could not create output layer'))
 
         # Generate contours using contourpy
-        feedback.pushInfo('Generating contours with contourpy...')
-        
+        feedback.pushInfo(f'Generating contours with contourpy ({algorithm})...')
+
         # Debug info
-        feedback.pushInfo(f'X range: {x[0]:.2f} to {x[-1]:.2f} ({len(x)} points)')
-        feedback.pushInfo(f'Y range: {y[0]:.2f} to {y[-1]:.2f} ({len(y)} points)')
-        feedback.pushInfo(f'Data shape: {data.shape}')
-        feedback.pushInfo(f'Data range: {np.nanmin(data):.2f} to {np.nanmax(data):.2f}')
-        
-        # Create contour generator
-        # Use line_type="Separate" which returns list of arrays (one array per line)
-        try:
-            cont_gen = contour_generator(
-                x, y, data,
-                name="serial",
-                line_type="Separate"  # Changed from "SeparateCode"
-            )
-            feedback.pushInfo('Contour generator created successfully')
-        except Exception as e:
-            raise QgsProcessingException(f'Failed to create contour generator: {str(e)}')
+        feedback.pushInfo(
+            f'X range: {extent.xMinimum() + reader.x_res / 2:.2f} to '
+            f'{extent.xMaximum() - reader.x_res / 2:.2f} ({width} points)'
+        )
+        feedback.pushInfo(
+            f'Y range: {extent.yMaximum() - reader.y_res / 2:.2f} to '
+            f'{extent.yMinimum() + reader.y_res / 2:.2f} ({height} points)'
+        )
+        if np.isfinite(vmin):
+            feedback.pushInfo(f'Data range: {vmin:.2f} to {vmax:.2f}')
+
+        if FAST_EMIT_AVAILABLE:
+            feedback.pushInfo('Using compiled feature emitter')
 
         total_features = 0
-        total_levels = len(levels)
+        total_tiles = len(tiles)
+        tile_results = self.contourTiles(
+            reader, tiles, levels, level_ids, algorithm, preloaded, (vmin, vmax)
+        )
 
-        for level_idx, level in enumerate(levels):
-            if feedback.isCanceled():
-                break
+        # Feature emission stays serial, the sink is not thread-safe
+        for tile_index, tile_levels in enumerate(tile_results):
+            if total_tiles > 1:
+                feedback.pushInfo(f'Processing tile {tile_index + 1}/{total_tiles}')
 
-            # Update progress
-            progress = int((level_idx / total_levels) * 100)
-            feedback.setProgress(progress)
-            feedback.pushInfo(f'Processing level {level:.2f} ({level_idx + 1}/{total_levels})')
+            for current, (level_idx, level, lines) in enumerate(tile_levels):
+                if feedback.isCanceled():
+                    break
 
-            # Generate contours at this level
-            try:
-                lines = cont_gen.lines(level)
-            except Exception as e:
-                feedback.reportError(f'Error generating contours at level {level}: {str(e)}')
-                continue
-
-            # lines is a list of numpy arrays, each containing coordinates
-            if not lines or len(lines) == 0:
-                continue
-
-            # Add features to sink
-            for line_array in lines:
-                # Convert to numpy array if it's a list
-                if isinstance(line_array, list):
-                    line_array = np.array(line_array)
-                
-                if not isinstance(line_array, np.ndarray):
-                    continue
-                
-                # Handle different array shapes
-                if line_array.ndim == 1:
-                    # 1D array - skip if too short
-                    if len(line_array) < 4:  # Need at least 2 points (x1, y1, x2, y2)
-                        continue
-                    # Reshape to (n, 2)
-                    line_array = line_array.reshape(-1, 2)
-                elif line_array.ndim == 2:
-                    # 2D array - should be (n_points, 2)
-                    if line_array.shape[0] < 2:
-                        continue
-                else:
-                    continue
+                # Update progress
+                progress = int((tile_index + current / len(tile_levels)) / total_tiles * 100)
+                feedback.setProgress(progress)
 
-                # Create feature
-                feature = QgsFeature()
-                feature.setFields(fields)
-
-                # Create geometry from coordinates
-                points = [QgsPointXY(float(line_array[i, 0]), float(line_array[i, 1])) 
-                         for i in range(line_array.shape[0])]
-                geometry = QgsGeometry.fromPolylineXY(points)
-                
-                if geometry.isNull():
-                    feedback.reportError(f'Failed to create geometry at level {level}')
+                # lines is a list of numpy arrays, each containing coordinates
+                if not lines:
                     continue
-                    
-                feature.setGeometry(geometry)
 
-                # Set attributes
-                feature.setAttribute('elevation', float(level))
-                feature.setAttribute('level_id', level_idx)
+                # Add features to sink
+                total_features += emit_lines(sink, lines, level, level_idx, fields, feedback)
 
-                # Add to sink
-                if sink.addFeature(feature):
-                    total_features += 1
+            if feedback.isCanceled():
+                tile_results.close()
+                break
 
         feedback.pushInfo(f'Generated {total_features} contour line segments')
         feedback.pushInfo('Contour generation complete!')
 
         return {self.OUTPUT: dest_id}
+
+    def contourTiles(self, reader, tiles, levels, level_ids, algorithm,
+                     preloaded=None, data_range=None):
+        """Generate contours tile by tile, yielding the results in tile order.
+
+        Tiles are read and contoured on a thread pool, keeping at most one
+        tile per worker queued so memory stays bounded. Each yielded item is
+        the list returned by contourTile(). A single preloaded tile is
+        contoured directly, with its already known data_range.
+        """
+        # Nothing to contour, skip contouring the tiles. A single tile has
+        # already been read, and interval mode has scanned the whole raster
+        # for its statistics.
+        if len(levels) == 0:
+            return
+
+        thread_count = os.cpu_count() or 1
+
+        if len(tiles) == 1:
+            yield self.contourTile(reader, tiles[0], levels, level_ids, algorithm,
+                                   thread_count, preloaded, data_range)
+            return
+
+        # Split the threads between tiles, contourpy gets what is left over
+        workers = min(thread_count, len(tiles))
+        tile_threads = max(1, thread_count // workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_tile = 0
+            try:
+                while pending or next_tile < len(tiles):
+                    while next_tile < len(tiles) and len(pending) <= workers:
+                        pending.append(executor.submit(
+                            self.contourTile, reader, tiles[next_tile], levels,
+                            level_ids, algorithm, tile_threads
+                        ))
+                        next_tile += 1
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def contourTile(self, reader, tile, levels, level_ids, algorithm, thread_count,
+                    data=None, data_range=None):
+        """Contour a single tile.
+
+        data and its data_range are read and computed here unless given.
+        Returns a list of (level_id, level, lines) tuples, one per level that
+        falls inside the tile's data range.
+        """
+        if data is None:
+            data = reader.read(tile)
+
+        # Only levels within this tile's range can produce contours here
+        if data_range is None:
+            data_range = np.nanmin(data), np.nanmax(data)
+        tile_min, tile_max = data_range
+        if np.isnan(tile_min):
+            return []
+        keep = (levels >= tile_min) & (levels <= tile_max)
+        if not keep.any():
+            return []
+        tile_levels = levels[keep]
+
+        x, y = reader.coordinates(tile)
+
+        # contourpy converts z to a C-contiguous float64 array itself, so
+        # float32 tiles are copied there regardless. Reader tiles are
+        # already C-contiguous, this only guards against strided input.
+        data = np.ascontiguousarray(data)
+
+        # Create contour generator
+        try:
+            cont_gen = self.createContourGenerator(x, y, data, algorithm, thread_count)
+        except Exception as e:
+            raise QgsProcessingException(f'Failed to create contour generator: {str(e)}')
+
+        # Generate contours for all levels in a single call
+        try:
+            if hasattr(cont_gen, 'multi_lines'):
+                all_lines = cont_gen.multi_lines(tile_levels)
+            else:
+                all_lines = [cont_gen.lines(level) for level in tile_levels]
+        except Exception as e:
+            raise QgsProcessingException(f'Error generating contours: {str(e)}')
+
+        # SeparateCode returns (points, codes), only the points are needed
+        if algorithm in SEPARATE_CODE_ALGORITHMS:
+            all_lines = [lines[0] for lines in all_lines]
+
+        # emit_lines() relies on every line being an (n_points, 2) float64
+        # array, check that once here rather than for every line
+        first = next((lines[0] for lines in all_lines if len(lines) > 0), None)
+        assert first is None or (
+            isinstance(first, np.ndarray) and first.ndim == 2 and first.dtype == np.float64
+        )
+
+        return list(zip(level_ids[keep], tile_levels, all_lines))
+
+    def createContourGenerator(self, x, y, data, algorithm, thread_count):
+        """Create a contourpy generator for the requested algorithm.
+
+        Only the threaded algorithm splits the grid into chunks, that is
+        what lets it work in parallel. contourpy does not join lines across
+        chunk boundaries, so the other algorithms contour the whole grid
+        as a single chunk.
+        """
+        if algorithm == 'gpu':
+            return GpuContourGenerator(x, y, data)
+
+        kwargs = {'chunk_size': 0}
+
+        if algorithm in SEPARATE_CODE_ALGORITHMS:
+            kwargs['line_type'] = 'SeparateCode'
+        else:
+            # line_type="Separate" returns a list of arrays (one array per line)
+            kwargs['line_type'] = 'Separate'
+
+        if algorithm == 'threaded':
+            kwargs['chunk_size'] = contour_chunk_size(data.shape, thread_count)
+            kwargs['thread_count'] = thread_count
+
+        try:
+            return contour_generator(x, y, data, name=algorithm, **kwargs)
+        except ValueError:
+            if algorithm != 'threaded':
+                raise
+            # Older contourpy versions do not provide the threaded algorithm
+            del kwargs['thread_count']
+            kwargs['chunk_size'] = 0
+            return contour_generator(x, y, data, name='serial', **kwargs)
@@ -0,0 +1,87 @@
+"""
+Fast Contour Emit - conversion of contour lines into output features
+
+This is the pure-Python implementation. _fast_emit.pyx provides a compiled
+emit_lines() with the same signature, used instead when it has been built.
+"""
+
+import struct
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureSink,
+    QgsGeometry,
+)
+
+# Number of features buffered before each sink.addFeatures() call
+FEATURE_BATCH_SIZE = 1000
+
+# WKB byte order marker and geometry type code for a 2D LineString
+WKB_LITTLE_ENDIAN = 1
+WKB_LINESTRING = 2
+
+# Byte order (1) + geometry type (4) + point count (4)
+WKB_HEADER_SIZE = 9
+
+
+def linestring_to_wkb(line_array):
+    """Build little-endian WKB for a LineString from an (n, 2) array."""
+    header = struct.pack('<BII', WKB_LITTLE_ENDIAN, WKB_LINESTRING, line_array.shape[0])
+    return header + line_array.astype('<f8', copy=False).tobytes()
+
+
+def flush_features(sink, batch, feedback):
+    """Write a batch of features to the sink and clear it.
+
+    Returns the number of features written.
+    """
+    if not batch:
+        return 0
+
+    count = len(batch)
+    if not sink.addFeatures(batch, QgsFeatureSink.FastInsert):
+        feedback.reportError(f'Failed to write {count} features to output layer')
+        count = 0
+
+    batch.clear()
+    return count
+
+
+def emit_lines(sink, line_arrays, level, level_idx, fields, feedback):
+    """Write the contour lines of one level to the sink.
+
+    Returns the number of features written.
+    """
+    total_features = 0
+    batch = []
+
+    # Attributes are identical for every line at this level
+    attributes = [float(level), int(level_idx)]
+
+    for line_array in line_arrays:
+        # contourpy returns (n_points, 2) float64 arrays, see contourTile()
+        if line_array.shape[0] < 2:
+            continue
+
+        # Create feature, the batch holds references so each line
+        # needs its own QgsFeature
+        feature = QgsFeature(fields)
+
+        # Create geometry from coordinates via WKB, a LineString with at
+        # least two points always yields a valid geometry
+        geometry = QgsGeometry()
+        geometry.fromWkb(linestring_to_wkb(line_array))
+        feature.setGeometry(geometry)
+
+        # Set attributes
+        feature.setAttributes(attributes)
+
+        # Add to sink in batches
+        batch.append(feature)
+        if len(batch) >= FEATURE_BATCH_SIZE:
+            total_features += flush_features(sink, batch, feedback)
+
+    # Write any remaining features
+    total_features += flush_features(sink, batch, feedback)
+
+    return total_features
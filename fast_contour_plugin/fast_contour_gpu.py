@@ -0,0 +1,324 @@
+"""
+Fast Contour GPU - marching squares contouring on a CUDA GPU using CuPy
+"""
+
+import threading
+
+import numpy as np
+
+# CuPy module, imported on first use so that loading the plugin doesn't
+# import CuPy or initialise CUDA
+cp = None
+_gpu_available = None
+
+# Threads per block in each direction, one thread per grid cell
+BLOCK_SIZE = 16
+
+# Corners of a cell are numbered cyclically: 0 = (i, j), 1 = (i, j + 1),
+# 2 = (i + 1, j + 1), 3 = (i + 1, j). Edge k joins corners k and (k + 1) % 4.
+# Horizontal edges are numbered first, then vertical edges, so each edge of
+# the grid has a single global id shared by the two cells on either side.
+# Local edge 4 is the diagonal of a cell with one NaN corner, numbered after
+# the vertical edges; such cells are contoured as the triangle of their
+# other three corners, as contourpy does with its default corner_mask=True.
+# Segments are oriented so that corners above the level lie on the same side;
+# the end of one segment is then always the start of the next one.
+KERNEL_SOURCE = r'''
+extern "C" {
+
+__device__ const int CORNER_DI[4] = {0, 0, 1, 1};
+__device__ const int CORNER_DJ[4] = {0, 1, 1, 0};
+
+// Writes the local edge pairs crossed by the level into seg and returns
+// the number of segments (0, 1 or 2) in cell (i, j). Each segment starts on
+// the edge where the cyclic order goes from below to above the level.
+// masked is set to the cell's NaN corner, or -1 if it has none.
+__device__ int cell_segments(const double* z, long long nx, long long i, long long j,
+                             double level, int* seg, int* masked)
+{
+    double c[4];
+    *masked = -1;
+    for (int k = 0; k < 4; ++k) {
+        c[k] = z[(i + CORNER_DI[k]) * nx + j + CORNER_DJ[k]];
+        if (isnan(c[k])) {
+            if (*masked >= 0) return 0;
+            *masked = k;
+        }
+    }
+
+    int above = 0;
+    for (int k = 0; k < 4; ++k) above |= (c[k] > level) << k;
+
+    // One NaN corner, contour the triangle of the other three. Its edges in
+    // cyclic order are cell edges a and b, then the diagonal from d to a.
+    if (*masked >= 0) {
+        int a = (*masked + 1) & 3, b = (*masked + 2) & 3, d = (*masked + 3) & 3;
+        int corner[3] = {a, b, d};
+        int edge[3] = {a, b, 4};
+        int n = 0;
+        for (int e = 0; e < 3; ++e) {
+            int p = (above >> corner[e]) & 1;
+            int q = (above >> corner[(e + 1) % 3]) & 1;
+            if (p != q) {
+                // Below to above is the start of the segment, seg[0]
+                seg[p] = edge[e];
+                ++n;
+            }
+        }
+        return n / 2;
+    }
+
+    if (above == 0 || above == 15) return 0;
+
+    // Saddle, resolved by the value at the cell centre
+    if (above == 5 || above == 10) {
+        double centre = 0.25 * (c[0] + c[1] + c[2] + c[3]);
+        if ((above == 5) == (centre > level)) {
+            // Cut off corners 1 and 3
+            seg[0] = 0; seg[1] = 1; seg[2] = 2; seg[3] = 3;
+        } else {
+            // Cut off corners 0 and 2
+            seg[0] = 3; seg[1] = 0; seg[2] = 1; seg[3] = 2;
+        }
+    } else {
+        int n = 0;
+        for (int k = 0; k < 4; ++k) {
+            if (((above >> k) ^ (above >> ((k + 1) & 3))) & 1) seg[n++] = k;
+        }
+    }
+
+    int n_segments = (above == 5 || above == 10) ? 2 : 1;
+    for (int s = 0; s < n_segments; ++s) {
+        if ((above >> seg[2 * s]) & 1) {
+            int k = seg[2 * s];
+            seg[2 * s] = seg[2 * s + 1];
+            seg[2 * s + 1] = k;
+        }
+    }
+    return n_segments;
+}
+
+__device__ long long edge_id(long long nx, long long ny, long long i, long long j, int k)
+{
+    long long n_horizontal = ny * (nx - 1);
+    long long n_vertical = (ny - 1) * nx;
+    switch (k) {
+        case 0: return i * (nx - 1) + j;
+        case 1: return n_horizontal + i * nx + j + 1;
+        case 2: return (i + 1) * (nx - 1) + j;
+        case 3: return n_horizontal + i * nx + j;
+        default: return n_horizontal + n_vertical + i * (nx - 1) + j;
+    }
+}
+
+// Interpolates along edge k, always from the corner with the lower grid
+// index so both cells sharing the edge produce bit-identical points. The
+// diagonal (k == 4) joins the two corners next to the masked one.
+__device__ void edge_point(const double* z, const double* x, const double* y,
+                           long long nx, long long i, long long j, int k, int masked,
+                           double level, double* point)
+{
+    int a = k, b = (k + 1) & 3;
+    if (k == 4) {
+        a = (masked + 1) & 1;
+        b = a + 2;
+    } else if (k >= 2) {
+        a = b; b = k;
+    }
+    long long ia = i + CORNER_DI[a], ja = j + CORNER_DJ[a];
+    long long ib = i + CORNER_DI[b], jb = j + CORNER_DJ[b];
+    double za = z[ia * nx + ja];
+    double t = (level - za) / (z[ib * nx + jb] - za);
+    point[0] = x[ja] + t * (x[jb] - x[ja]);
+    point[1] = y[ia] + t * (y[ib] - y[ia]);
+}
+
+__global__ void count_segments(const double* z, int nx, int ny, double level, int* counts)
+{
+    long long j = blockIdx.x * blockDim.x + threadIdx.x;
+    long long i = blockIdx.y * blockDim.y + threadIdx.y;
+    if (i >= ny - 1 || j >= nx - 1) return;
+
+    int seg[4], masked;
+    counts[i * (nx - 1) + j] = cell_segments(z, nx, i, j, level, seg, &masked);
+}
+
+__global__ void emit_segments(const double* z, const double* x, const double* y,
+                              int nx, int ny, double level, const long long* offsets,
+                              long long* edges, double* points)
+{
+    long long j = blockIdx.x * blockDim.x + threadIdx.x;
+    long long i = blockIdx.y * blockDim.y + threadIdx.y;
+    if (i >= ny - 1 || j >= nx - 1) return;
+
+    int seg[4], masked;
+    int n = cell_segments(z, nx, i, j, level, seg, &masked);
+    long long out = offsets[i * (nx - 1) + j];
+    for (int s = 0; s < n; ++s) {
+        for (int e = 0; e < 2; ++e) {
+            long long end = 2 * (out + s) + e;
+            int k = seg[2 * s + e];
+            edges[end] = edge_id(nx, ny, i, j, k);
+            edge_point(z, x, y, nx, i, j, k, masked, level, points + 2 * end);
+        }
+    }
+}
+
+}
+'''
+
+_kernels = None
+_kernels_lock = threading.Lock()
+
+
+def gpu_available():
+    """Return True if CuPy is installed and a CUDA device is present.
+
+    CuPy is imported, and CUDA initialised, on the first call only.
+    """
+    global cp, _gpu_available
+    if _gpu_available is None:
+        try:
+            import cupy
+            _gpu_available = cupy.cuda.runtime.getDeviceCount() > 0
+            cp = cupy
+        except Exception:
+            # ImportError without CuPy, CUDARuntimeError without a driver or device
+            _gpu_available = False
+    return _gpu_available
+
+
+def gpu_kernels():
+    """Compile the marching squares kernels on first use.
+
+    Tiles are contoured on several threads, the lock makes sure the
+    kernels are only compiled once.
+    """
+    global _kernels
+    with _kernels_lock:
+        if _kernels is None:
+            module = cp.RawModule(code=KERNEL_SOURCE)
+            _kernels = (
+                module.get_function('count_segments'),
+                module.get_function('emit_segments'),
+            )
+    return _kernels
+
+
+def stitch_segments(edges, points):
+    """Join oriented line segments into polylines.
+
+    edges is an (n, 2) array of the global ids of the start and end edge of
+    each segment, and points the matching (n, 2, 2) array of coordinates.
+    A segment is followed by the one starting on the edge it ends on, so
+    the segments form open chains and closed rings. Chains are ordered with
+    pointer jumping, O(log n) vectorised passes rather than a Python loop
+    per segment. Returns a list of (n_points, 2) float64 arrays.
+    """
+    n_segments = edges.shape[0]
+    if n_segments == 0:
+        return []
+
+    segments = np.arange(n_segments)
+
+    # Successor of each segment, -1 at the end of an open chain. Both sides
+    # are sorted, edge ids are unique per side, so the search runs in order.
+    start_order = np.argsort(edges[:, 0])
+    end_order = np.argsort(edges[:, 1])
+    sorted_starts = edges[start_order, 0]
+    sorted_ends = edges[end_order, 1]
+    pos = np.minimum(np.searchsorted(sorted_starts, sorted_ends), n_segments - 1)
+    following = np.empty(n_segments, dtype=np.int64)
+    following[end_order] = np.where(sorted_starts[pos] == sorted_ends, start_order[pos], -1)
+    preceding = np.full(n_segments, -1, dtype=np.int64)
+    has_following = following >= 0
+    preceding[following[has_following]] = segments[has_following]
+
+    # Segments that never reach a chain end are in rings, each ring is cut
+    # open at its lowest segment index. Passes stop once no more segments
+    # reach their chain end and the ring minima no longer change.
+    jump = np.where(has_following, following, segments)
+    label = segments.copy()
+    reached = np.count_nonzero(~has_following)
+    while True:
+        next_label = np.minimum(label, label[jump])
+        jump = jump[jump]
+        next_reached = np.count_nonzero(following[jump] < 0)
+        if next_reached == reached and np.array_equal(next_label, label):
+            break
+        label, reached = next_label, next_reached
+    in_ring = following[jump] >= 0
+    preceding[in_ring & (label == segments)] = -1
+
+    # Rank each segment within its chain and find the chain's first segment
+    jump = np.where(preceding >= 0, preceding, segments)
+    rank = (preceding >= 0).astype(np.int64)
+    while True:
+        next_jump = jump[jump]
+        if np.array_equal(next_jump, jump):
+            break
+        rank += rank[jump]
+        jump = next_jump
+
+    # Place each segment at its chain's offset plus its rank
+    heads = np.flatnonzero(preceding < 0)
+    lengths = np.bincount(jump, minlength=n_segments)[heads]
+    chain_ends = np.cumsum(lengths)
+    head_offsets = np.zeros(n_segments, dtype=np.int64)
+    head_offsets[heads] = chain_ends - lengths
+    ordered = np.empty(n_segments, dtype=np.int64)
+    ordered[head_offsets[jump] + rank] = segments
+
+    # Start points in chain order, plus the end point of each chain's last
+    # segment, which for a ring repeats its first point
+    coords = np.insert(
+        points[ordered, 0], chain_ends, points[ordered[chain_ends - 1], 1], axis=0
+    )
+    return np.split(coords, chain_ends[:-1] + np.arange(1, len(chain_ends)))
+
+
+class GpuContourGenerator:
+    """Marching squares contour generator running on a CUDA GPU.
+
+    The grid is uploaded once and reused for every level. Each level runs a
+    counting pass, an exclusive scan to compact the output, and an emit
+    pass writing the segments, which are downloaded and stitched into
+    polylines on the CPU. lines() and multi_lines() return the same
+    layout as contourpy's line_type="Separate", and NaN corners are
+    handled like contourpy's default corner_mask=True.
+    """
+
+    def __init__(self, x, y, z):
+        self.ny, self.nx = z.shape
+        self.x = cp.asarray(x, dtype=cp.float64)
+        self.y = cp.asarray(y, dtype=cp.float64)
+        self.z = cp.asarray(z, dtype=cp.float64)
+        self.counts = cp.empty((self.ny - 1) * (self.nx - 1), dtype=cp.int32)
+
+    def lines(self, level):
+        """Return the contour lines at a single level."""
+        # A grid without cells would launch an empty, invalid CUDA grid
+        if self.nx < 2 or self.ny < 2:
+            return []
+
+        count_segments, emit_segments = gpu_kernels()
+        grid = (-(-(self.nx - 1) // BLOCK_SIZE), -(-(self.ny - 1) // BLOCK_SIZE))
+        block = (BLOCK_SIZE, BLOCK_SIZE)
+        nx, ny, level = np.int32(self.nx), np.int32(self.ny), np.float64(level)
+
+        count_segments(grid, block, (self.z, nx, ny, level, self.counts))
+        offsets = cp.cumsum(self.counts, dtype=cp.int64)
+        total = int(offsets[-1])
+        if total == 0:
+            return []
+        offsets -= self.counts
+
+        edges = cp.empty((total, 2), dtype=cp.int64)
+        points = cp.empty((total, 2, 2), dtype=cp.float64)
+        emit_segments(grid, block, (self.z, self.x, self.y, nx, ny, level, offsets, edges, points))
+
+        return stitch_segments(cp.asnumpy(edges), cp.asnumpy(points))
+
+    def multi_lines(self, levels):
+        """Return the contour lines for each of several levels."""
+        return [self.lines(level) for level in levels]
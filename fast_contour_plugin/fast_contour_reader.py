@@ -0,0 +1,241 @@
+"""
+Fast Contour Reader - tiled reading of raster bands into numpy arrays
+"""
+
+import threading
+
+import numpy as np
+from qgis.core import (
+    Qgis,
+    QgsProcessingException,
+    QgsRasterRange,
+    QgsRectangle,
+)
+
+try:
+    from osgeo import gdal
+    GDAL_AVAILABLE = True
+except ImportError:
+    GDAL_AVAILABLE = False
+
+# Tile edge length in pixels, bounds the memory used per tile
+TILE_SIZE = 2048
+
+# Mapping of QGIS raster data types to numpy dtypes
+QGIS_TO_NUMPY_DTYPE = {
+    Qgis.Byte: np.uint8,
+    Qgis.UInt16: np.uint16,
+    Qgis.Int16: np.int16,
+    Qgis.UInt32: np.uint32,
+    Qgis.Int32: np.int32,
+    Qgis.Float32: np.float32,
+    Qgis.Float64: np.float64,
+}
+
+# Int8 rasters are only supported from QGIS 3.30
+if hasattr(Qgis, 'Int8'):
+    QGIS_TO_NUMPY_DTYPE[Qgis.Int8] = np.int8
+
+
+def qgis_to_numpy_dtype(data_type):
+    """Return the numpy dtype matching a QGIS raster data type."""
+    try:
+        return QGIS_TO_NUMPY_DTYPE[data_type]
+    except KeyError:
+        raise QgsProcessingException(
+            f'Unsupported raster data type: {data_type}'
+        )
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE):
+    """Split a raster into tiles overlapping by one pixel.
+
+    Returns a list of (row0, row1, col0, col1) pixel ranges, end exclusive.
+    Neighbouring tiles share their edge row or column, so contours from
+    adjacent tiles meet exactly at the tile boundary.
+    """
+    step = tile_size - 1
+    rows = [(r, min(r + tile_size, height)) for r in range(0, max(height - 1, 1), step)]
+    cols = [(c, min(c + tile_size, width)) for c in range(0, max(width - 1, 1), step)]
+    return [(row0, row1, col0, col1) for row0, row1 in rows for col0, col1 in cols]
+
+
+def in_raster_range(data, raster_range):
+    """Return a mask of the values of data inside a QgsRasterRange.
+
+    A NaN minimum or maximum leaves that side of the range open.
+    """
+    lower, upper = raster_range.min(), raster_range.max()
+    bounds = raster_range.bounds()
+
+    mask = np.ones(data.shape, dtype=bool)
+    if not np.isnan(lower):
+        if bounds in (QgsRasterRange.IncludeMinAndMax, QgsRasterRange.IncludeMin):
+            mask &= data >= lower
+        else:
+            mask &= data > lower
+    if not np.isnan(upper):
+        if bounds in (QgsRasterRange.IncludeMinAndMax, QgsRasterRange.IncludeMax):
+            mask &= data <= upper
+        else:
+            mask &= data < upper
+    return mask
+
+
+class RasterTileReader:
+    """Reads tiles of a raster band as float arrays with NoData set to NaN.
+
+    Plain GDAL rasters are read with GDAL directly, straight into a numpy
+    buffer, other sources (WMS, virtual rasters, ...) through the QGIS data
+    provider. Neither providers nor GDAL datasets are thread-safe, so
+    threads other than the main thread read through their own copy.
+    """
+
+    def __init__(self, provider, band_number, extent, width, height):
+        self.provider = provider
+        self.band_number = band_number
+        self.extent = extent
+        self.x_res = extent.width() / width
+        self.y_res = extent.height() / height
+
+        # NoData always comes from the provider so that both read paths
+        # honour the layer's "use source NoData" and user NoData settings
+        self.nodata = None
+        if provider.sourceHasNoDataValue(band_number) and provider.useSourceNoDataValue(band_number):
+            self.nodata = provider.sourceNoDataValue(band_number)
+        self.user_nodata = list(provider.userNoDataValues(band_number))
+
+        self.dataset = self.openGdalDataset(provider, band_number, width, height)
+
+        self._local = threading.local()
+
+    @staticmethod
+    def openGdalDataset(provider, band_number, width, height):
+        """Open the provider's source with GDAL if it can be read directly.
+
+        Returns None unless the source is a GDAL raster with the same
+        north-up pixel grid as the layer and unscaled values. ReadAsArray()
+        returns raw stored values, whereas the provider applies the band's
+        scale and offset, so scaled bands go through provider.block().
+        """
+        if not GDAL_AVAILABLE or provider.name() != 'gdal':
+            return None
+
+        try:
+            dataset = gdal.Open(provider.dataSourceUri(), gdal.GA_ReadOnly)
+        except RuntimeError:
+            return None
+        if dataset is None or dataset.RasterCount < band_number:
+            return None
+
+        geotransform = dataset.GetGeoTransform()
+        if (dataset.RasterXSize != width or dataset.RasterYSize != height
+                or geotransform[2] != 0 or geotransform[4] != 0 or geotransform[5] >= 0):
+            return None
+
+        band = dataset.GetRasterBand(band_number)
+        if (band.GetScale() or 1) != 1 or (band.GetOffset() or 0) != 0:
+            return None
+
+        return dataset
+
+    def threadDataset(self):
+        """Return a GDAL dataset that is safe to use from this thread."""
+        if threading.current_thread() is threading.main_thread():
+            return self.dataset
+
+        dataset = getattr(self._local, 'dataset', None)
+        if dataset is None:
+            dataset = gdal.Open(self.dataset.GetDescription(), gdal.GA_ReadOnly)
+            self._local.dataset = dataset
+        return dataset
+
+    def threadProvider(self):
+        """Return a data provider that is safe to use from this thread."""
+        if threading.current_thread() is threading.main_thread():
+            return self.provider
+
+        provider = getattr(self._local, 'provider', None)
+        if provider is None:
+            provider = self.provider.clone()
+            self._local.provider = provider
+        return provider
+
+    def read(self, tile):
+        """Read a tile as a float32 (or float64) array, NoData as NaN.
+
+        Single precision halves the tile buffer held between reading and
+        contouring, contourpy still converts each tile to float64 while
+        contouring it.
+        """
+        row0, row1, col0, col1 = tile
+        rows = row1 - row0
+        cols = col1 - col0
+
+        if self.dataset is not None:
+            data = self.readGdal(col0, row0, cols, rows)
+        else:
+            data = self.readBlock(col0, row0, cols, rows)
+
+        # Replace nodata with NaN in place, contourpy treats NaN as missing
+        if self.nodata is not None or self.user_nodata:
+            if not data.flags.writeable:
+                # Float arrays read straight from the block buffer are read-only
+                data = data.copy()
+            if self.nodata is not None:
+                np.copyto(data, np.nan, where=(data == self.nodata))
+            for nodata_range in self.user_nodata:
+                np.copyto(data, np.nan, where=in_raster_range(data, nodata_range))
+
+        return data
+
+    def readGdal(self, col0, row0, cols, rows):
+        """Read a window with GDAL straight into a float array."""
+        band = self.threadDataset().GetRasterBand(self.band_number)
+
+        # Work in single precision unless the source is already double
+        if band.DataType == gdal.GDT_Float64:
+            buf_type = gdal.GDT_Float64
+        else:
+            buf_type = gdal.GDT_Float32
+
+        data = band.ReadAsArray(col0, row0, cols, rows, buf_type=buf_type)
+        if data is None:
+            raise QgsProcessingException(
+                f'Failed to read raster window at row {row0}, column {col0}'
+            )
+        return data
+
+    def readBlock(self, col0, row0, cols, rows):
+        """Read a window through the QGIS data provider as a float array."""
+        tile_extent = QgsRectangle(
+            self.extent.xMinimum() + col0 * self.x_res,
+            self.extent.yMaximum() - (row0 + rows) * self.y_res,
+            self.extent.xMinimum() + (col0 + cols) * self.x_res,
+            self.extent.yMaximum() - row0 * self.y_res
+        )
+        block = self.threadProvider().block(self.band_number, tile_extent, cols, rows)
+
+        # Convert to numpy array in one copy, keeping the native data type
+        data = np.frombuffer(
+            bytes(block.data()),
+            dtype=qgis_to_numpy_dtype(block.dataType())
+        ).reshape(rows, cols)
+
+        # Work in single precision unless the source is already double,
+        # integer rasters are promoted to float32 rather than float64
+        if data.dtype != np.float64:
+            data = data.astype(np.float32, copy=False)
+
+        return data
+
+    def coordinates(self, tile):
+        """Return the pixel centre x and y coordinates of a tile.
+
+        Coordinates stay float64: they are only width + height long and
+        float32 cannot resolve sub-metre positions in projected CRSs.
+        """
+        row0, row1, col0, col1 = tile
+        x = self.extent.xMinimum() + (np.arange(col0, col1, dtype=np.float64) + 0.5) * self.x_res
+        y = self.extent.yMaximum() - (np.arange(row0, row1, dtype=np.float64) + 0.5) * self.y_res
+        return x, y
@@ -0,0 +1,117 @@
+"""
+Tests for the GPU contouring module
+
+stitch_segments() is pure numpy and always tested, the kernels only where
+CuPy and a CUDA device are available.
+"""
+
+import numpy as np
+import pytest
+
+from fast_contour_plugin.fast_contour_gpu import (
+    GpuContourGenerator,
+    gpu_available,
+    stitch_segments,
+)
+
+
+def line_segments(lines):
+    """Split polylines into oriented (edges, points) segments.
+
+    Each point gets its own edge id, the last point of a closed line
+    reuses the id of the first.
+    """
+    edges, points = [], []
+    next_id = 0
+    for line in lines:
+        ids = np.arange(next_id, next_id + len(line))
+        if np.array_equal(line[0], line[-1]):
+            ids[-1] = ids[0]
+        next_id += len(line)
+        edges.append(np.stack([ids[:-1], ids[1:]], axis=1))
+        points.append(np.stack([line[:-1], line[1:]], axis=1))
+    return np.concatenate(edges), np.concatenate(points)
+
+
+def sorted_segments(lines):
+    """Return the directed segments of lines, in a canonical order."""
+    return sorted(tuple(np.round(segment, 9).ravel()) for segment in line_segments(lines)[1])
+
+
+def sorted_lines(lines):
+    """Return lines as comparable tuples, in a canonical order."""
+    return sorted(tuple(np.round(line, 9).ravel()) for line in lines)
+
+
+def smooth_grid(nan_fraction=0.0):
+    x = np.linspace(-3, 3, 80)
+    y = np.linspace(-2, 2, 60)
+    xx, yy = np.meshgrid(x, y)
+    z = (np.exp(-xx**2 - yy**2)
+         + 0.5 * np.exp(-(xx - 1.5)**2 - 3 * (yy - 0.5)**2)
+         + 0.3 * np.sin(3 * xx) * np.cos(2 * yy))
+    z[np.random.default_rng(3).random(z.shape) < nan_fraction] = np.nan
+    return x, y, z
+
+
+def test_stitch_empty():
+    assert stitch_segments(np.empty((0, 2), np.int64), np.empty((0, 2, 2))) == []
+
+
+def test_stitch_open_chain():
+    edges = np.array([[2, 3], [1, 2], [9, 8]])
+    points = np.arange(12, dtype=np.float64).reshape(3, 2, 2)
+    lines = stitch_segments(edges, points)
+
+    assert sorted_lines(lines) == sorted_lines([
+        np.array([[4, 5], [0, 1], [2, 3]], dtype=np.float64),
+        np.array([[8, 9], [10, 11]], dtype=np.float64),
+    ])
+
+
+def test_stitch_ring_is_closed():
+    ring = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]], dtype=np.float64)
+    edges, points = line_segments([ring])
+    lines = stitch_segments(edges[::-1], points[::-1])
+
+    assert len(lines) == 1
+    assert len(lines[0]) == len(ring)
+    assert np.array_equal(lines[0][0], lines[0][-1])
+
+
+def test_stitch_shuffled_contours():
+    contourpy = pytest.importorskip('contourpy')
+    x, y, z = smooth_grid()
+    expected = contourpy.contour_generator(x, y, z, line_type='Separate').lines(0.3)
+
+    edges, points = line_segments(expected)
+    order = np.random.default_rng(0).permutation(len(edges))
+    lines = stitch_segments(edges[order], points[order])
+
+    # Rings may start at a different point, compare their segments
+    assert len(lines) == len(expected)
+    assert sum(len(line) for line in lines) == sum(len(line) for line in expected)
+    assert sorted_segments(lines) == sorted_segments(expected)
+
+
+@pytest.mark.skipif(not gpu_available(), reason='requires CuPy and a CUDA device')
+@pytest.mark.parametrize('nan_fraction', [0.0, 0.1, 0.3])
+def test_gpu_matches_serial(nan_fraction):
+    contourpy = pytest.importorskip('contourpy')
+    x, y, z = smooth_grid(nan_fraction)
+    levels = [0.1, 0.3, 0.55, 0.8]
+
+    gpu = GpuContourGenerator(x, y, z).multi_lines(levels)
+    serial = contourpy.contour_generator(x, y, z, line_type='Separate').multi_lines(levels)
+
+    for gpu_lines, serial_lines in zip(gpu, serial):
+        assert len(gpu_lines) == len(serial_lines)
+        assert sum(len(line) for line in gpu_lines) == sum(len(line) for line in serial_lines)
+        length = sum(np.hypot(*np.diff(line, axis=0).T).sum() for line in gpu_lines)
+        expected = sum(np.hypot(*np.diff(line, axis=0).T).sum() for line in serial_lines)
+        assert length == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.skipif(not gpu_available(), reason='requires CuPy and a CUDA device')
+def test_gpu_small_grid():
+    assert GpuContourGenerator(np.arange(3.0), np.arange(1.0), np.ones((1, 3))).lines(0.5) == []